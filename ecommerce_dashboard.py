@@ -2,9 +2,14 @@
 # E-COMMERCE DASHBOARD (FULL VERSION WITH DESCRIPTIONS)
 # =============================
 
+import os
+
 import streamlit as st
+import numpy as np
 import pandas as pd
+import polars as pl
 import plotly.express as px
+import plotly.graph_objects as go
 
 # -----------------------------
 # PAGE CONFIG
@@ -40,24 +45,83 @@ We are using a dataset with **10,000 orders** containing the following columns:
 # -----------------------------
 # LOAD DATA
 # -----------------------------
-df = pd.read_csv("ecommerce_analysis.csv")
-
-# -----------------------------
-# DATA CLEANING
-# -----------------------------
-# Convert numeric columns
-df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
-
-# Convert dates safely
-df['Invoice_Date'] = pd.to_datetime(
-    df['Invoice_Date'],
-    dayfirst=True,
-    errors='coerce'
-)
-
-# Drop rows with critical missing values
-df = df.dropna(subset=['Invoice_Number', 'Invoice_Date', 'Customer_ID', 'Amount'])
+CSV_PATH = "ecommerce_analysis.csv"
+# Bump the version when the conversion rules change, so files written
+# by an older version are rebuilt instead of reused
+PARQUET_PATH = "ecommerce_analysis.v2.parquet"
+
+# One-time conversion: the raw CSV is cleaned once and streamed to Parquet
+# with its final dtypes, so the app never re-parses text on load.
+def convert_to_parquet(csv_path, parquet_path):
+    tmp_path = parquet_path + ".tmp"
+    # Columns that get cleaned are read as text, so a bad value anywhere in
+    # the file becomes null on cast instead of failing schema inference
+    try:
+        (
+            pl.scan_csv(
+                csv_path,
+                schema_overrides={'Quantity': pl.String, 'Amount': pl.String, 'Invoice_Date': pl.String}
+            )
+
+            # -----------------------------
+            # DATA CLEANING
+            # -----------------------------
+            # Convert numeric columns and dates safely (bad values become null)
+            .with_columns(
+                pl.col('Quantity').cast(pl.Int32, strict=False),
+                pl.col('Amount').cast(pl.Float64, strict=False),
+                pl.col('Invoice_Date').str.to_datetime('%Y-%m-%d %H:%M:%S', time_unit='ns', strict=False)
+            )
+
+            # Drop rows with critical missing values
+            .drop_nulls(subset=['Invoice_Number', 'Invoice_Date', 'Customer_ID', 'Amount'])
+            .sink_parquet(tmp_path)
+        )
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Swap the finished file into place so a failed run never leaves a
+    # partial Parquet behind
+    os.replace(tmp_path, parquet_path)
+
+# Loading is memoized across reruns, so widget interactions only pay
+# for filtering and plotting. cache_resource hands every rerun the same
+# DataFrame without copying it, so callers must treat it as read-only.
+@st.cache_resource
+def load_data(path):
+    # Rebuild whenever the CSV has been edited since the last conversion
+    if not os.path.exists(path) or os.path.getmtime(CSV_PATH) > os.path.getmtime(path):
+        convert_to_parquet(CSV_PATH, path)
+    df = pd.read_parquet(path, dtype_backend="pyarrow")
+
+    # Filter choices come straight from the categories of these columns
+    for col in ('Country', 'Product'):
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+# Sidebar choices only depend on the data file, so they are computed once
+# per file rather than scanning the columns on every rerun.
+@st.cache_data
+def filter_options(path):
+    df = load_data(path)
+    country_options = df['Country'].cat.categories.tolist()
+    product_options = df['Product'].cat.categories.tolist() if 'Product' in df.columns else []
+    return country_options, product_options
+
+# The schema is fixed per data file, so optional columns are checked once
+@st.cache_data
+def has_product_column(path):
+    return 'Product' in load_data(path).columns
+
+# One row per invoice lets order counts use row counts instead of n_unique
+@st.cache_data
+def has_unique_invoices(path):
+    return load_data(path)['Invoice_Number'].is_unique
+
+df = load_data(PARQUET_PATH)
+country_options, product_options = filter_options(PARQUET_PATH)
 
 # -----------------------------
 # INTERACTIVE FILTERS
@@ -66,14 +130,14 @@ st.sidebar.header("🔍 Filters")
 
 countries = st.sidebar.multiselect(
     "Select Countries",
-    options=df['Country'].unique(),
-    default=df['Country'].unique()
+    options=country_options,
+    default=country_options
 )
 
 products = st.sidebar.multiselect(
     "Select Products",
-    options=df['Product'].unique() if 'Product' in df.columns else [],
-    default=df['Product'].unique() if 'Product' in df.columns else []
+    options=product_options,
+    default=product_options
 )
 
 date_range = st.sidebar.date_input(
@@ -81,13 +145,123 @@ date_range = st.sidebar.date_input(
     [df['Invoice_Date'].min(), df['Invoice_Date'].max()]
 )
 
-# Apply filters
-df_filtered = df[
-    (df['Country'].isin(countries)) &
-    ((df['Product'].isin(products)) if 'Product' in df.columns else True) &
-    (df['Invoice_Date'] >= pd.to_datetime(date_range[0])) &
-    (df['Invoice_Date'] <= pd.to_datetime(date_range[1]))
-]
+# -----------------------------
+# AGGREGATIONS
+# -----------------------------
+# Quintile (1-5) of each value's position in a stable sort. Ties are
+# broken by order of appearance, giving the same bins as pd.qcut over
+# rank(method='first') without the rank and qcut passes.
+def quintile_scores(values):
+    n = len(values)
+    position = np.empty(n, dtype=np.int64)
+    position[np.argsort(values, kind='stable')] = np.arange(n)
+    return np.maximum(-(-5 * position // max(n - 1, 1)), 1).astype(np.int16)
+
+# RFM scoring on the per-customer Recency/Frequency/Monetary table
+def score_rfm(rfm):
+    # Quintile scores (never fails)
+    r = 6 - quintile_scores(rfm['Recency'].to_numpy())
+    f = quintile_scores(rfm['Frequency'].to_numpy())
+    m = quintile_scores(rfm['Monetary'].to_numpy())
+    rfm['R_Score'] = r
+    rfm['F_Score'] = f
+    rfm['M_Score'] = m
+
+    # Three-digit score (e.g. 545) kept as an integer code
+    rfm['RFM_Score'] = r * 100 + f * 10 + m
+
+    # Optional: add segments
+    segment_rules = [
+        (r >= 4) & (f >= 4) & (m >= 4),
+        (r >= 4) & (f <= 2),
+        (r <= 2) & (f >= 4),
+    ]
+    segment_names = ["Best Customers", "New Customers", "Loyal Customers"]
+    rfm['Segment'] = pd.Categorical(np.select(segment_rules, segment_names, default="Others"))
+
+    return rfm
+
+# The filter is built once as a Polars lazy query and shared by every
+# aggregate; collect_all runs them together so the filtered rows are
+# computed a single time. Results are memoized on the filter selection,
+# so reruns that don't change the filters skip the pipeline entirely.
+@st.cache_data
+def compute_aggregates(path, countries, products, start_date, end_date):
+    lf = pl.scan_parquet(path)
+    has_product = has_product_column(path)
+
+    predicate = (
+        pl.col('Country').is_in(countries) &
+        pl.col('Invoice_Date').is_between(start_date, end_date)
+    )
+    if has_product:
+        predicate &= pl.col('Product').is_in(products)
+    flt = lf.filter(predicate)
+    order_count = pl.len() if has_unique_invoices(path) else pl.col('Invoice_Number').n_unique()
+
+    kpis_q = flt.select(
+        pl.col('Amount').sum().alias('Total_Sales'),
+        order_count.alias('Total_Orders'),
+        pl.col('Customer_ID').n_unique().alias('Total_Customers')
+    )
+    sales_time_q = (
+        flt.group_by(pl.col('Invoice_Date').dt.truncate('1d'))
+        .agg(pl.col('Amount').sum())
+        .sort('Invoice_Date')
+    )
+    country_sales_q = (
+        flt.group_by('Country')
+        .agg(pl.col('Amount').sum())
+        .top_k(10, by='Amount')
+        .sort('Amount', descending=True)
+    )
+    top_products_q = (
+        flt.group_by('Product')
+        .agg(pl.col('Amount').sum())
+        .top_k(10, by='Amount')
+        .sort('Amount', descending=True)
+    ) if has_product else pl.LazyFrame({'Product': [], 'Amount': []})
+    # Recency, Frequency and Monetary inputs come from one grouped pass
+    customers_q = flt.group_by('Customer_ID', maintain_order=True).agg(
+        pl.col('Invoice_Date').max().alias('Last_Purchase'),
+        order_count.alias('Frequency'),
+        pl.col('Amount').sum().alias('Monetary')
+    )
+    kpis, sales_time, country_sales, top_products, customers = pl.collect_all(
+        [kpis_q, sales_time_q, country_sales_q, top_products_q, customers_q]
+    )
+    total_sales, total_orders, total_customers = kpis.row(0)
+
+    # Keep empty days in the trend as zero-revenue points
+    if sales_time.height > 0:
+        sales_time = sales_time.upsample('Invoice_Date', every='1d').fill_null(0)
+
+    # The latest purchase overall is the max of the per-customer maxima
+    rfm = customers.to_pandas()
+    last_purchase = rfm.pop('Last_Purchase')
+    snapshot_date = last_purchase.max() + np.timedelta64(1, 'D')
+    rfm.insert(1, 'Recency', (snapshot_date - last_purchase).dt.days.astype('int32'))
+    rfm = score_rfm(rfm)
+
+    return (
+        (total_sales, total_orders, total_customers),
+        sales_time.to_pandas(),
+        country_sales.to_pandas(),
+        top_products.to_pandas(),
+        rfm
+    )
+
+# Date bounds are converted once, before they reach the query
+start_date = np.datetime64(date_range[0], 'ns')
+end_date = np.datetime64(date_range[1], 'ns')
+
+(
+    (total_sales, total_orders, total_customers),
+    sales_time,
+    country_sales,
+    top_products,
+    rfm
+) = compute_aggregates(PARQUET_PATH, tuple(countries), tuple(products), start_date, end_date)
 
 # -----------------------------
 # KPI METRICS
@@ -101,9 +275,6 @@ These metrics summarize the overall business performance at a glance:
 - **Average Order Value (AOV):** Average revenue per order.
 """)
 
-total_sales = df_filtered['Amount'].sum()
-total_orders = df_filtered['Invoice_Number'].nunique()
-total_customers = df_filtered['Customer_ID'].nunique()
 avg_order_value = total_sales / total_orders if total_orders > 0 else 0
 
 c1, c2, c3, c4 = st.columns(4)
@@ -123,19 +294,14 @@ Observe peaks and dips in sales — these may correspond to **promotional campai
 Analyzing this trend helps with **forecasting and inventory planning**.
 """)
 
-sales_time = (
-    df_filtered.groupby(pd.Grouper(key='Invoice_Date', freq='D'))['Amount']
-    .sum()
-    .reset_index()
-)
-
-fig_time = px.line(
-    sales_time,
-    x='Invoice_Date',
-    y='Amount',
-    title="Daily Sales Trend",
-    markers=True
+fig_time = go.Figure(
+    go.Scattergl(
+        x=sales_time['Invoice_Date'].to_numpy(),
+        y=sales_time['Amount'].to_numpy(),
+        mode='lines+markers'
+    )
 )
+fig_time.update_layout(title="Daily Sales Trend", xaxis_title='Invoice_Date', yaxis_title='Amount')
 st.plotly_chart(fig_time, use_container_width=True)
 
 # -----------------------------
@@ -149,28 +315,22 @@ It helps identify which regions contribute the most to your business.
 You can use this insight to **focus marketing and logistics efforts** in high-performing regions.
 """)
 
-country_sales = (
-    df_filtered.groupby('Country')['Amount']
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-    .reset_index()
-)
-
-fig_country = px.bar(
-    country_sales,
-    x='Country',
-    y='Amount',
-    title="Top 10 Countries by Revenue",
-    text='Amount'
+fig_country = go.Figure(
+    go.Bar(
+        x=country_sales['Country'].to_numpy(),
+        y=country_sales['Amount'].to_numpy(),
+        text=country_sales['Amount'].to_numpy(),
+        texttemplate='$%{text:.2f}',
+        textposition='outside'
+    )
 )
-fig_country.update_traces(texttemplate='$%{text:.2f}', textposition='outside')
+fig_country.update_layout(title="Top 10 Countries by Revenue", xaxis_title='Country', yaxis_title='Amount')
 st.plotly_chart(fig_country, use_container_width=True)
 
 # -----------------------------
 # TOP PRODUCTS
 # -----------------------------
-if 'Product' in df_filtered.columns:
+if has_product_column(PARQUET_PATH):
     st.divider()
     st.header("🛍️ Top 10 Products by Sales")
     st.markdown("""
@@ -178,22 +338,16 @@ This shows the **top 10 revenue-generating products**.
 Focus on these products for **inventory planning, promotions, and marketing campaigns**.
 """)
 
-    top_products = (
-        df_filtered.groupby('Product')['Amount']
-        .sum()
-        .sort_values(ascending=False)
-        .head(10)
-        .reset_index()
+    fig_products = go.Figure(
+        go.Bar(
+            x=top_products['Product'].to_numpy(),
+            y=top_products['Amount'].to_numpy(),
+            text=top_products['Amount'].to_numpy(),
+            texttemplate='$%{text:.2f}',
+            textposition='outside'
+        )
     )
-
-    fig_products = px.bar(
-        top_products,
-        x='Product',
-        y='Amount',
-        title="Top 10 Products by Revenue",
-        text='Amount'
-    )
-    fig_products.update_traces(texttemplate='$%{text:.2f}', textposition='outside')
+    fig_products.update_layout(title="Top 10 Products by Revenue", xaxis_title='Product', yaxis_title='Amount')
     st.plotly_chart(fig_products, use_container_width=True)
 
 # -----------------------------
@@ -215,48 +369,6 @@ Customer segmentation helps identify:
 The RFM Score combines these three metrics into a single score for easier segmentation.
 """)
 
-snapshot_date = df_filtered['Invoice_Date'].max() + pd.Timedelta(days=1)
-
-rfm = (
-    df_filtered.groupby('Customer_ID')
-    .agg({
-        'Invoice_Date': lambda x: (snapshot_date - x.max()).days,
-        'Invoice_Number': 'nunique',
-        'Amount': 'sum'
-    })
-    .reset_index()
-)
-rfm.columns = ['Customer_ID', 'Recency', 'Frequency', 'Monetary']
-
-# Rank customers (safe)
-rfm['R_rank'] = rfm['Recency'].rank(method='first', ascending=True)
-rfm['F_rank'] = rfm['Frequency'].rank(method='first', ascending=True)
-rfm['M_rank'] = rfm['Monetary'].rank(method='first', ascending=True)
-
-# Qcut scores (never fails)
-rfm['R_Score'] = pd.qcut(rfm['R_rank'], 5, labels=[5,4,3,2,1])
-rfm['F_Score'] = pd.qcut(rfm['F_rank'], 5, labels=[1,2,3,4,5])
-rfm['M_Score'] = pd.qcut(rfm['M_rank'], 5, labels=[1,2,3,4,5])
-
-rfm['RFM_Score'] = (
-    rfm['R_Score'].astype(str) +
-    rfm['F_Score'].astype(str) +
-    rfm['M_Score'].astype(str)
-)
-
-# Optional: add segments
-def rfm_segment(row):
-    if int(row['R_Score']) >= 4 and int(row['F_Score']) >= 4 and int(row['M_Score']) >= 4:
-        return "Best Customers"
-    elif int(row['R_Score']) >= 4 and int(row['F_Score']) <= 2:
-        return "New Customers"
-    elif int(row['R_Score']) <= 2 and int(row['F_Score']) >= 4:
-        return "Loyal Customers"
-    else:
-        return "Others"
-
-rfm['Segment'] = rfm.apply(rfm_segment, axis=1)
-
 st.subheader("RFM Table Preview")
 st.dataframe(rfm[['Customer_ID', 'RFM_Score', 'Segment']].head(20))
 
@@ -269,6 +381,8 @@ fig_rfm = px.histogram(
     title="Customer RFM Score Distribution",
     text_auto=True
 )
+# One bar per score, as with string labels, without building them
+fig_rfm.update_xaxes(type='category')
 st.plotly_chart(fig_rfm, use_container_width=True)
 
 # -----------------------------